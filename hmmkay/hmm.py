@@ -1,9 +1,12 @@
-from numba import njit
+from numba import njit, prange, get_num_threads, types
+from numba.typed import List
 import numpy as np
 
 from .utils import (
     _choice,
     _logsumexp,
+    _logsumexp_axis0,
+    _logaddexp,
     _check_array_sums_to_1,
     _check_random_state,
     _argmax,
@@ -31,10 +34,17 @@ class HMM:
         st = i)``.
     n_iter : int, default=10
         Number of iterations to run for the EM algorithm (in ``fit()``).
+    dtype : {np.float64, np.float32}, default=np.float64
+        Floating point precision used in ``log_likelihood()`` and
+        ``decode()``. ``np.float32`` halves the memory used by the forward
+        and Viterbi passes, at the cost of precision. ``fit()`` always uses
+        ``np.float64``.
 
     """
 
-    def __init__(self, init_probas, transitions, emissions, n_iter=10):
+    def __init__(
+        self, init_probas, transitions, emissions, n_iter=10, dtype=np.float64
+    ):
 
         self.init_probas = np.array(init_probas, dtype=np.float64)
         self.transitions = np.array(transitions, dtype=np.float64)
@@ -42,6 +52,10 @@ class HMM:
 
         self.n_iter = n_iter
 
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"dtype must be np.float32 or np.float64, got {dtype}.")
+
         self.n_hidden_states = self.A.shape[0]
         self.n_observable_states = self.B.shape[1]
 
@@ -51,6 +65,7 @@ class HMM:
             raise ValueError("inconsistent number of hidden states.")
 
         self._check_matrices_conditioning()
+        self._warm_up()
 
     def log_likelihood(self, sequences):
         """Compute log-likelihood of sequences.
@@ -65,12 +80,11 @@ class HMM:
         -------
         log_likelihood : array of shape (n_seq,)
         """
-        total_log_likelihood = 0
         sequences, n_obs_max = check_sequences(sequences, return_longest_length=True)
-        log_alpha = np.empty(shape=(self.n_hidden_states, n_obs_max), dtype=np.float32)
-        for seq in sequences:
-            total_log_likelihood += self._forward(seq, log_alpha)
-        return total_log_likelihood
+        log_pi, log_A, log_B = self._get_log_matrices(self.dtype)
+        return _log_likelihood_all(
+            sequences, log_pi, log_A, log_B, n_obs_max, _get_n_chunks(sequences)
+        )
 
     def decode(self, sequences, return_log_probas=False):
         """Decode sequences with Viterbi algorithm.
@@ -98,27 +112,32 @@ class HMM:
         """
         sequences, n_obs_max = check_sequences(sequences, return_longest_length=True)
 
-        hidden_states_sequences = []
-        log_probas = []
-
-        log_V = np.empty(shape=(self.n_hidden_states, n_obs_max), dtype=np.float32)
-        back_path = np.empty(shape=(self.n_hidden_states, n_obs_max), dtype=np.int32)
-
-        for seq in sequences:
-            n_obs = seq.shape[0]
-            self._viterbi(seq, log_V, back_path)
-            best_path = np.empty(n_obs, dtype=np.int32)
-            log_proba = _get_best_path(log_V, back_path, best_path)
-            hidden_states_sequences.append(best_path)
-            if return_log_probas:
-                log_probas.append(log_proba)
-
         if isinstance(sequences, np.ndarray):
             # All sequences have the same length
-            hidden_states_sequences = np.array(hidden_states_sequences)
+            hidden_states_sequences = np.empty(shape=sequences.shape, dtype=np.int32)
+        else:
+            hidden_states_sequences = List.empty_list(types.int32[:])
+            for seq in sequences:
+                hidden_states_sequences.append(np.empty(len(seq), dtype=np.int32))
+        log_probas = np.empty(shape=len(sequences))
+
+        log_pi, log_A, log_B = self._get_log_matrices(self.dtype)
+        _decode_all(
+            sequences,
+            log_pi,
+            log_A,
+            log_B,
+            n_obs_max,
+            _get_n_chunks(sequences),
+            hidden_states_sequences,
+            log_probas,
+        )
+
+        if isinstance(hidden_states_sequences, List):
+            hidden_states_sequences = list(hidden_states_sequences)
 
         if return_log_probas:
-            return hidden_states_sequences, np.array(log_probas)
+            return hidden_states_sequences, log_probas
         else:
             return hidden_states_sequences
 
@@ -171,41 +190,89 @@ class HMM:
         self : HMM instance
         """
         sequences, n_obs_max = check_sequences(sequences, return_longest_length=True)
-        log_alpha = np.empty(shape=(self.n_hidden_states, n_obs_max))
-        log_beta = np.empty(shape=(self.n_hidden_states, n_obs_max))
-        # E[i, j, t] = P(st = i, st+1 = j / O, lambda)
-        log_E = np.empty(
-            shape=(self.n_hidden_states, self.n_hidden_states, n_obs_max - 1)
-        )
-        # g[i, t] = P(st = i / O, lambda)
-        log_gamma = np.empty(shape=(self.n_hidden_states, n_obs_max))
+        n_chunks = _get_n_chunks(sequences)
 
         for _ in range(self.n_iter):
 
+            # Only for debugging and tests. Elided with python -O.
+            if __debug__ and getattr(self, "_enable_sanity_checks", False):
+                for seq in sequences:
+                    self._sanity_check_E_gamma(*self._get_log_E_gamma(seq))
+
             self.pi, self.A, self.B = _do_EM_step(
-                sequences,
-                self._log_pi,
-                self._log_A,
-                self._log_B,
-                log_alpha,
-                log_beta,
-                log_E,
-                log_gamma,
+                sequences, self._log_pi, self._log_A, self._log_B, n_obs_max, n_chunks
             )
             self._check_matrices_conditioning()
         return self
 
+    def _warm_up(self):
+        """Run the numba functions on tiny inputs to compile them.
+
+        This avoids attributing the compilation time to the first call of
+        log_likelihood(), decode() or fit(). Thanks to ``cache=True``, this
+        is only slow the very first time: compiled functions are then loaded
+        from the cache.
+        """
+        # Sequences are of length 2 so that all the code paths are used.
+        # Both input types accepted by check_sequences are compiled.
+        sequences_array = np.zeros(shape=(1, 2), dtype=np.int32)
+        sequences_list = List.empty_list(types.int32[:])
+        sequences_list.append(np.zeros(2, dtype=np.int32))
+        for sequences in (sequences_array, sequences_list):
+            self.log_likelihood(sequences)
+            self.decode(sequences)
+            # Not calling fit(), which would update the parameters
+            _do_EM_step(sequences, self._log_pi, self._log_A, self._log_B, 2, 1)
+
     def _viterbi(self, seq, log_V, back_path):
         # dummy wrapper for conveniency
-        _viterbi(seq, self._log_pi, self._log_A, self._log_B, log_V, back_path)
+        _viterbi(self._log_pi, self._log_A, self._log_B[:, seq], log_V, back_path)
 
     def _forward(self, seq, log_alpha):
         # dummy wrapper for conveniency
-        return _forward(seq, self._log_pi, self._log_A, self._log_B, log_alpha)
+        return _forward(self._log_pi, self._log_A, self._log_B[:, seq], log_alpha)
 
     def _backward(self, seq, log_beta):
         # dummy wrapper for conveniency
-        return _backward(seq, self._log_pi, self._log_A, self._log_B, log_beta)
+        return _backward(self._log_pi, self._log_A, self._log_B[:, seq], log_beta)
+
+    def _get_log_E_gamma(self, seq):
+        """Return log_E and log_gamma of seq, as computed in the E-step"""
+        # Slow, numpy-only equivalent of what _do_E_step computes
+        n_obs = seq.shape[0]
+        log_alpha = np.empty(shape=(self.n_hidden_states, n_obs))
+        log_beta = np.empty(shape=(self.n_hidden_states, n_obs))
+        log_likelihood = self._forward(seq, log_alpha)
+        self._backward(seq, log_beta)
+        log_B_seq = self._log_B[:, seq]
+
+        log_E = (
+            log_alpha[:, None, :-1]
+            + self._log_A[:, :, None]
+            + log_B_seq[None, :, 1:]
+            + log_beta[None, :, 1:]
+            - log_likelihood
+        )
+        log_gamma = log_alpha + log_beta - log_likelihood
+        return log_E, log_gamma
+
+    def _sanity_check_E_gamma(self, log_E, log_gamma):
+        E = np.exp(log_E)
+        gamma = np.exp(log_gamma)
+        # sum_i gamma[i, t] = 1
+        np.testing.assert_allclose(gamma.sum(axis=0), 1)
+        # sum_ij E[i, j, t] = 1
+        np.testing.assert_allclose(E.sum(axis=(0, 1)), 1)
+        # sum_j E[i, j, t] = gamma[i, t]
+        np.testing.assert_allclose(E.sum(axis=1), gamma[:, :-1])
+
+    def _get_log_matrices(self, dtype):
+        """Return _log_pi, _log_A and _log_B converted to dtype"""
+        return (
+            self._log_pi.astype(dtype, copy=False),
+            self._log_A.astype(dtype, copy=False),
+            self._log_B.astype(dtype, copy=False),
+        )
 
     def _check_matrices_conditioning(self):
 
@@ -267,6 +334,14 @@ class HMM:
         return self.__log_B
 
 
+def _get_n_chunks(sequences):
+    """Return the number of chunks sequences are split into."""
+    # Sequences are processed in parallel by chunks, one chunk per thread.
+    # This is computed outside of the numba functions, because calling
+    # get_num_threads() from there prevents them from being cached.
+    return max(1, min(get_num_threads(), len(sequences)))
+
+
 @njit(cache=True)
 def _sample_one(n_obs, pi, A, B, seed):
     """Return (observations, hidden_states) sample"""
@@ -285,7 +360,19 @@ def _sample_one(n_obs, pi, A, B, seed):
 
 
 @njit(cache=True)
-def _forward(seq, log_pi, log_A, log_B, log_alpha):
+def _gather_log_B(log_B, seq, log_B_seq):
+    """Fill the first len(seq) columns of log_B_seq with log_B[:, seq]"""
+    # log_B_seq[i, t] = log_B[i, seq[t]]. Gathering the emission columns once
+    # per sequence avoids indexing log_B with seq[t] in all the inner loops.
+    n_hidden_states = log_B.shape[0]
+    for t in range(seq.shape[0]):
+        o = seq[t]
+        for s in range(n_hidden_states):
+            log_B_seq[s, t] = log_B[s, o]
+
+
+@njit(cache=True)
+def _forward(log_pi, log_A, log_B_seq, log_alpha):
     """Fill log_alpha array with log probabilities, return log-likelihood"""
     # alpha[i, t] = P(O1, ... Ot, st = i / lambda)
     # reccursion is alpha[i, t] = B[i, Ot] * sumj(alpha[j, t - 1] * A[i, j])
@@ -295,49 +382,88 @@ def _forward(seq, log_pi, log_A, log_B, log_alpha):
     # since log(sum(ai . bj)) =
     #       log(sum(exp(log_ai + log_bi)))
 
-    n_obs = len(seq)
+    # All the logsumexps of a given t are computed at once, column-wise over
+    # the (n_hidden_states, n_hidden_states) matrix log_alpha[:, t - 1, None]
+    # + log_A. The matrix is traversed row by row so that log_A is read
+    # contiguously.
+
+    n_obs = log_B_seq.shape[1]
     n_hidden_states = log_pi.shape[0]
-    log_alpha[:, 0] = log_pi + log_B[:, seq[0]]
-    buffer = np.empty(shape=n_hidden_states)
+    for s in range(n_hidden_states):
+        log_alpha[s, 0] = log_pi[s] + log_B_seq[s, 0]
+    col_max = np.empty(shape=n_hidden_states, dtype=log_alpha.dtype)
+    col_sum = np.empty(shape=n_hidden_states, dtype=log_alpha.dtype)
     for t in range(1, n_obs):
+        # Explicit loops instead of col_max[:] = ... and col_sum[:] = ...
+        # which have a noticeable overhead for small n_hidden_states.
         for s in range(n_hidden_states):
-            for ss in range(n_hidden_states):
-                buffer[ss] = log_alpha[ss, t - 1] + log_A[ss, s]
-            log_alpha[s, t] = _logsumexp(buffer) + log_B[s, seq[t]]
+            col_max[s] = -np.inf
+        for ss in range(n_hidden_states):
+            log_alpha_ss = log_alpha[ss, t - 1]
+            for s in range(n_hidden_states):
+                col_max[s] = max(col_max[s], log_alpha_ss + log_A[ss, s])
+        for s in range(n_hidden_states):
+            if not np.isfinite(col_max[s]):
+                col_max[s] = 0
+            col_sum[s] = 0
+        for ss in range(n_hidden_states):
+            log_alpha_ss = log_alpha[ss, t - 1]
+            for s in range(n_hidden_states):
+                col_sum[s] += np.exp(log_alpha_ss + log_A[ss, s] - col_max[s])
+        for s in range(n_hidden_states):
+            log_alpha[s, t] = np.log(col_sum[s]) + col_max[s] + log_B_seq[s, t]
     return _logsumexp(log_alpha[:, n_obs - 1])
 
 
 @njit(cache=True)
-def _backward(seq, log_pi, log_A, log_B, log_beta):
+def _backward(log_pi, log_A, log_B_seq, log_beta):
     """Fills beta array with log probabilities"""
     # beta[i, t] = P(Ot+1, ... OT, / st = i, lambda)
 
-    n_obs = seq.shape[0]
+    n_obs = log_B_seq.shape[1]
     n_hidden_states = log_pi.shape[0]
     log_beta[:, n_obs - 1] = np.log(1)
-    buffer = np.empty(shape=n_hidden_states)
+    buffer = np.empty(shape=n_hidden_states, dtype=log_beta.dtype)
+    # log_B_seq[:, t + 1] + log_beta[:, t + 1] doesn't depend on s: it is
+    # gathered once per t into a contiguous vector, so that the inner loop
+    # only reads contiguous memory (log_A is read row by row).
+    log_B_beta = np.empty(shape=n_hidden_states, dtype=log_beta.dtype)
     for t in range(n_obs - 2, -1, -1):
+        for ss in range(n_hidden_states):
+            log_B_beta[ss] = log_B_seq[ss, t + 1] + log_beta[ss, t + 1]
         for s in range(n_hidden_states):
             for ss in range(n_hidden_states):
-                buffer[ss] = log_A[s, ss] + log_B[ss, seq[t + 1]] + log_beta[ss, t + 1]
+                buffer[ss] = log_A[s, ss] + log_B_beta[ss]
             log_beta[s, t] = _logsumexp(buffer)
 
 
 @njit(cache=True)
-def _viterbi(seq, log_pi, log_A, log_B, log_V, back_path):
+def _viterbi(log_pi, log_A, log_B_seq, log_V, back_path):
     """Fill V array with log probabilities and back_path with back links"""
     # V[i, t] = max_{s1...st-1} P(O1, ... Ot, s1, ... st-1, st=i / lambda)
-    n_obs = seq.shape[0]
+    n_obs = log_B_seq.shape[1]
     n_hidden_states = log_pi.shape[0]
-    log_V[:, 0] = log_pi + log_B[:, seq[0]]
-    buffer = np.empty(shape=n_hidden_states)
+    # As in _forward, the max and argmax over ss of log_V[ss, t - 1] +
+    # log_A[ss, s] are computed for all s at once, in a single pass reading
+    # log_A row by row. Ties are resolved in favor of the smallest ss.
+    for s in range(n_hidden_states):
+        log_V[s, 0] = log_pi[s] + log_B_seq[s, 0]
+    col_max = np.empty(shape=n_hidden_states, dtype=log_V.dtype)
+    col_argmax = np.empty(shape=n_hidden_states, dtype=np.int32)
     for t in range(1, n_obs):
         for s in range(n_hidden_states):
-            for ss in range(n_hidden_states):
-                buffer[ss] = log_V[ss, t - 1] + log_A[ss, s]
-            best_prev = _argmax(buffer)
-            back_path[s, t] = best_prev
-            log_V[s, t] = buffer[best_prev] + log_B[s, seq[t]]
+            col_max[s] = -np.inf
+            col_argmax[s] = 0
+        for ss in range(n_hidden_states):
+            log_V_ss = log_V[ss, t - 1]
+            for s in range(n_hidden_states):
+                v = log_V_ss + log_A[ss, s]
+                if v > col_max[s]:
+                    col_max[s] = v
+                    col_argmax[s] = ss
+        for s in range(n_hidden_states):
+            back_path[s, t] = col_argmax[s]
+            log_V[s, t] = col_max[s] + log_B_seq[s, t]
 
 
 @njit(cache=True)
@@ -352,50 +478,165 @@ def _get_best_path(log_V, back_path, best_path):
     return out
 
 
-@njit(cache=True)
-def _do_EM_step(sequences, log_pi, log_A, log_B, log_alpha, log_beta, log_E, log_gamma):
-    """Return A, B and C after EM step."""
-    # E STEP (over all sequences)
-    # Accumulators for parameters of the hmm. They are summed over for
-    # each sequence, then normalized in the M-step.
-    # These are homogeneous to probabilities, not log-probabilities.
-    pi_acc = np.zeros_like(log_pi)
-    A_acc = np.zeros_like(log_A)
-    B_acc = np.zeros_like(log_B)
-
+@njit(cache=True, parallel=True)
+def _log_likelihood_all(sequences, log_pi, log_A, log_B, n_obs_max, n_chunks):
+    """Return the total log-likelihood of sequences"""
+    # Sequences are split into strided chunks processed in parallel, each
+    # chunk having its own scratch buffers (see _do_EM_step).
+    n_seq = len(sequences)
     n_hidden_states = log_pi.shape[0]
+    log_likelihoods = np.zeros(shape=n_chunks)
+    for chunk_idx in prange(n_chunks):
+        log_alpha = np.empty(shape=(n_hidden_states, n_obs_max), dtype=log_B.dtype)
+        log_B_seq = np.empty(shape=(n_hidden_states, n_obs_max), dtype=log_B.dtype)
+        for seq_idx in range(chunk_idx, n_seq, n_chunks):
+            seq = sequences[seq_idx]
+            n_obs = seq.shape[0]
+            _gather_log_B(log_B, seq, log_B_seq)
+            log_likelihoods[chunk_idx] += _forward(
+                log_pi, log_A, log_B_seq[:, :n_obs], log_alpha
+            )
+    return log_likelihoods.sum()
 
-    for seq_idx in range(len(sequences)):  # numba can't iterate over 2D arrays
-        seq = sequences[seq_idx]
-        n_obs = seq.shape[0]
-        log_likelihood = _forward(seq, log_pi, log_A, log_B, log_alpha)
-        _backward(seq, log_pi, log_A, log_B, log_beta)
-
-        # Compute E
-        for t in range(n_obs - 1):
-            for i in range(n_hidden_states):
-                for j in range(n_hidden_states):
-                    log_E[i, j, t] = (
-                        log_alpha[i, t]
-                        + log_A[i, j]
-                        + log_B[j, seq[t + 1]]
-                        + log_beta[j, t + 1]
-                        - log_likelihood
-                    )
 
-        # compute gamma
-        log_gamma = log_alpha + log_beta - log_likelihood
+@njit(cache=True, parallel=True)
+def _decode_all(
+    sequences, log_pi, log_A, log_B, n_obs_max, n_chunks, best_paths, log_probas
+):
+    """Fill best_paths and log_probas with the Viterbi decoding of sequences"""
+    # Sequences are split into strided chunks processed in parallel, each
+    # chunk having its own scratch buffers (see _do_EM_step).
+    n_seq = len(sequences)
+    n_hidden_states = log_pi.shape[0]
+    for chunk_idx in prange(n_chunks):
+        log_V = np.empty(shape=(n_hidden_states, n_obs_max), dtype=log_B.dtype)
+        back_path = np.empty(shape=(n_hidden_states, n_obs_max), dtype=np.int32)
+        log_B_seq = np.empty(shape=(n_hidden_states, n_obs_max), dtype=log_B.dtype)
+        for seq_idx in range(chunk_idx, n_seq, n_chunks):
+            seq = sequences[seq_idx]
+            n_obs = seq.shape[0]
+            _gather_log_B(log_B, seq, log_B_seq)
+            _viterbi(log_pi, log_A, log_B_seq[:, :n_obs], log_V, back_path)
+            log_probas[seq_idx] = _get_best_path(log_V, back_path, best_paths[seq_idx])
 
-        # M STEP accumulators
-        pi_acc += np.exp(log_gamma[:, 0])
-        A_acc += np.sum(np.exp(log_E[:, :, : n_obs - 1]), axis=-1)
-        for t in range(n_obs):
-            B_acc[:, seq[t]] += np.exp(log_gamma[:, t])
+
+@njit(cache=True, parallel=True)
+def _do_EM_step(sequences, log_pi, log_A, log_B, n_obs_max, n_chunks):
+    """Return A, B and C after EM step."""
+    # E STEP (over all sequences)
+    # Sequences are split into chunks that are processed in parallel. Each
+    # chunk has its own scratch buffers and its own accumulators for the
+    # parameters of the hmm. The accumulators are summed over for each
+    # sequence of the chunk, then summed over chunks and normalized in the
+    # M-step.
+    # The accumulators are log-probabilities: sums are computed with
+    # logaddexp / logsumexp, and we only go back to probabilities in the
+    # M-step. This avoids underflows of E and gamma for long sequences.
+    n_seq = len(sequences)
+    n_hidden_states, n_observable_states = log_B.shape
+    log_pi_acc = np.full((n_chunks, n_hidden_states), -np.inf)
+    log_A_acc = np.full((n_chunks, n_hidden_states, n_hidden_states), -np.inf)
+    log_B_acc = np.full((n_chunks, n_hidden_states, n_observable_states), -np.inf)
+
+    for chunk_idx in prange(n_chunks):
+        log_alpha = np.empty(shape=(n_hidden_states, n_obs_max))
+        log_beta = np.empty(shape=(n_hidden_states, n_obs_max))
+        # log_B_seq[i, t] = log(B[i, Ot])
+        log_B_seq = np.empty(shape=(n_hidden_states, n_obs_max))
+        # E[i, j, t] = P(st = i, st+1 = j / O, lambda), for a given (i, j)
+        log_E_ij = np.empty(shape=n_obs_max - 1)
+        # g[i, t] = P(st = i / O, lambda)
+        log_gamma = np.empty(shape=(n_hidden_states, n_obs_max))
+
+        # Strided chunks, so that sequences of variable lengths are spread
+        # evenly.
+        for seq_idx in range(chunk_idx, n_seq, n_chunks):
+            _do_E_step(
+                sequences[seq_idx],
+                log_pi,
+                log_A,
+                log_B,
+                log_alpha,
+                log_beta,
+                log_B_seq,
+                log_E_ij,
+                log_gamma,
+                log_pi_acc[chunk_idx],
+                log_A_acc[chunk_idx],
+                log_B_acc[chunk_idx],
+            )
 
     # M STEP (mostly done in the accumulators already)
-    pi = pi_acc / pi_acc.sum()
-    # equivalent to X / X.sum(axis=1, keepdims=True) but not supported
-    A = A_acc / A_acc.sum(axis=1).reshape(-1, 1)
-    B = B_acc / B_acc.sum(axis=1).reshape(-1, 1)
+    log_pi_acc = _logsumexp_axis0(log_pi_acc)
+    log_A_acc = _logsumexp_axis0(log_A_acc.reshape(n_chunks, -1))
+    log_B_acc = _logsumexp_axis0(log_B_acc.reshape(n_chunks, -1))
+    pi = _exp_normalize(log_pi_acc.reshape(1, -1))[0]
+    A = _exp_normalize(log_A_acc.reshape(n_hidden_states, -1))
+    B = _exp_normalize(log_B_acc.reshape(n_hidden_states, -1))
 
     return pi, A, B
+
+
+@njit(cache=True)
+def _exp_normalize(log_X):
+    """Return exp(log_X), with rows normalized to sum to 1"""
+    # Rows are shifted by their max before exponentiating, which doesn't
+    # change the normalized result.
+    X = np.empty_like(log_X)
+    for i in range(log_X.shape[0]):
+        X[i] = np.exp(log_X[i] - np.max(log_X[i]))
+        X[i] /= X[i].sum()
+    return X
+
+
+@njit(cache=True)
+def _do_E_step(
+    seq,
+    log_pi,
+    log_A,
+    log_B,
+    log_alpha,
+    log_beta,
+    log_B_seq,
+    log_E_ij,
+    log_gamma,
+    log_pi_acc,
+    log_A_acc,
+    log_B_acc,
+):
+    """Add contributions of seq to the log pi, A and B accumulators."""
+    n_hidden_states = log_pi.shape[0]
+    n_obs = seq.shape[0]
+    _gather_log_B(log_B, seq, log_B_seq)
+    log_likelihood = _forward(log_pi, log_A, log_B_seq[:, :n_obs], log_alpha)
+    _backward(log_pi, log_A, log_B_seq[:, :n_obs], log_beta)
+
+    # compute gamma, in place to avoid allocating an array per sequence
+    for i in range(n_hidden_states):
+        for t in range(n_obs):
+            log_gamma[i, t] = log_alpha[i, t] + log_beta[i, t] - log_likelihood
+
+    # M STEP accumulators
+    for i in range(n_hidden_states):
+        log_pi_acc[i] = _logaddexp(log_pi_acc[i], log_gamma[i, 0])
+    # E is only needed summed over t, so it's never stored entirely: for each
+    # (i, j), log_E[i, j, :] is computed into log_E_ij and reduced right away.
+    # log_A[i, j] - log_likelihood is constant over t and is added after the
+    # reduction.
+    if n_obs > 1:
+        for i in range(n_hidden_states):
+            for j in range(n_hidden_states):
+                for t in range(n_obs - 1):
+                    log_E_ij[t] = (
+                        log_alpha[i, t] + log_B_seq[j, t + 1] + log_beta[j, t + 1]
+                    )
+                log_A_acc[i, j] = _logaddexp(
+                    log_A_acc[i, j],
+                    _logsumexp(log_E_ij[: n_obs - 1]) + log_A[i, j] - log_likelihood,
+                )
+    # Scatter gamma into the columns of B given by the observations. Looping
+    # over t last reads log_gamma row by row.
+    for i in range(n_hidden_states):
+        for t in range(n_obs):
+            o = seq[t]
+            log_B_acc[i, o] = _logaddexp(log_B_acc[i, o], log_gamma[i, t])
@@ -30,15 +30,41 @@ def _choice(p):
 @njit(cache=True)
 def _logsumexp(a):
     # stolen from pygbm \o/
+    # Explicit loops: unlike np.sum(np.exp(a - a_max)), this doesn't allocate
+    # a temporary array, and this is called in the inner loops.
 
-    a_max = np.amax(a)
+    a_max = a[0]
+    for i in range(1, a.shape[0]):
+        if a[i] > a_max:
+            a_max = a[i]
     if not np.isfinite(a_max):
         a_max = 0
 
-    s = np.sum(np.exp(a - a_max))
+    s = 0.0
+    for i in range(a.shape[0]):
+        s += np.exp(a[i] - a_max)
     return np.log(s) + a_max
 
 
+@njit(cache=True)
+def _logaddexp(a, b):
+    """Return log(exp(a) + exp(b)) for scalars a and b"""
+    if a == -np.inf:
+        return b
+    if b == -np.inf:
+        return a
+    return max(a, b) + np.log1p(np.exp(-abs(a - b)))
+
+
+@njit(cache=True)
+def _logsumexp_axis0(a):
+    """Return logsumexp of 2d array a over its first axis"""
+    out = np.empty(shape=a.shape[1])
+    for i in range(a.shape[1]):
+        out[i] = _logsumexp(a[:, i])
+    return out
+
+
 @njit(cache=True)
 def _argmax(a):
     # Apparently much faster than np.argmax in our context
@@ -192,8 +218,9 @@ def check_sequences(sequences, return_longest_length=False):
     sequences : array-like of shape (n_seq, n_obs) or list/typed list of iterables of \
             variable length.
         Lists of iterables are converted to typed lists of
-        numpy arrays, which can have different lengths. 2D arrays are
-        untouched (all sequences have the same length).
+        numpy arrays, which can have different lengths. 2D arrays (all
+        sequences have the same length) are converted to C-contiguous int32
+        arrays, without a copy if they already are.
 
     return_longest_length : bool, default=False
         If True, also return the length of the longest sequence.
@@ -216,6 +243,8 @@ def check_sequences(sequences, return_longest_length=False):
 
         sequences = new_sequences
     elif isinstance(sequences, np.ndarray):
+        # Avoids compiling the numba functions for every possible dtype
+        sequences = np.ascontiguousarray(sequences, dtype=np.int32)
         if return_longest_length:
             longest_seq_length = sequences.shape[1]
     else:
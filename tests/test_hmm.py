@@ -119,6 +119,33 @@ def test_EM_against_hmmlearn(toy_params, sequences):
     np.testing.assert_allclose(hmm.B, hmm_learn_model.emissionprob_)
 
 
+@pytest.mark.parametrize("sequences", (SEQUENCES_SAME_LENGTHS, SEQUENCES_DIFF_LENGTHS))
+def test_float32(toy_params, sequences):
+    # Make sure log_likelihood and decode give similar results with float32
+    # and float64
+
+    pi, A, B = toy_params
+    hmm_64 = HMM(pi, A, B)
+    hmm_32 = HMM(pi, A, B, dtype=np.float32)
+
+    assert hmm_32.log_likelihood(sequences) == pytest.approx(
+        hmm_64.log_likelihood(sequences), rel=1e-5
+    )
+
+    hidden_states_sequences_64, log_probas_64 = hmm_64.decode(
+        sequences, return_log_probas=True
+    )
+    hidden_states_sequences_32, log_probas_32 = hmm_32.decode(
+        sequences, return_log_probas=True
+    )
+    for seq_64, seq_32 in zip(hidden_states_sequences_64, hidden_states_sequences_32):
+        np.testing.assert_array_equal(seq_64, seq_32)
+    np.testing.assert_allclose(log_probas_32, log_probas_64, rtol=1e-5)
+
+    with pytest.raises(ValueError, match="dtype must be"):
+        HMM(pi, A, B, dtype=np.int32)
+
+
 def test_sample(toy_params):
     # Make sure shapes are  as expected
     # Also make sure random_state behaves properly
@@ -3,6 +3,7 @@ import numpy as np
 from numba import types
 from numba.typed import List
 
+from hmmkay import utils
 from hmmkay.utils import (
     _check_array_sums_to_1,
     make_proba_matrices,
@@ -77,3 +78,20 @@ def check_sequences(sequences, expected_type, expected_longest_length):
     sequences, longest_length = check_sequences(sequences, return_longest_length=True)
     assert isinstance(sequences, expected_type)
     assert longest_length == expected_longest_length
+
+
+@pytest.mark.parametrize("dtype", (np.int32, np.int64))
+@pytest.mark.parametrize("order", ("C", "F"))
+def test_check_sequences_2d_array(dtype, order):
+    # 2d arrays are converted to C-contiguous int32 arrays, and are only
+    # copied if needed
+
+    sequences = np.asarray(np.arange(20).reshape(4, 5), dtype=dtype, order=order)
+    # check_sequences is shadowed by the test above
+    checked_sequences = utils.check_sequences(sequences)
+    assert checked_sequences.dtype == np.int32
+    assert checked_sequences.flags.c_contiguous
+    np.testing.assert_array_equal(checked_sequences, sequences)
+
+    if dtype == np.int32 and order == "C":
+        assert checked_sequences is sequences